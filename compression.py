@@ -1,27 +1,275 @@
 import os
 import zipfile
 import shutil
-import hashlib
 import time
 import logging
+import struct
+import zlib
+import queue
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
-import re
+from threading import BoundedSemaphore, Event, Lock, Thread, Timer
+
+# 导入其他模块
+from utils import calculate_file_hash, file_suffix, is_image_name
+
+try:
+    # isa-l 提供AVX2/AVX-512加速的DEFLATE和CRC32，未安装时回退到标准zlib
+    from isal import isal_zlib as deflate_backend
+except ImportError:
+    deflate_backend = zlib
 
 logger = logging.getLogger("ComicCompressor")
 
+# ZIP文件格式结构（与zipfile模块保持一致）
+_LOCAL_FILE_HEADER = struct.Struct("<4s2B4HL2L2H")
+_CENTRAL_DIR_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+_END_OF_CENTRAL_DIR = struct.Struct("<4s4H2LH")
+_ZIP64_END_OF_CENTRAL_DIR = struct.Struct("<4sQ2H2L4Q")
+_ZIP64_END_LOCATOR = struct.Struct("<4sLQL")
+_ZIP64_LIMIT = (1 << 31) - 1
+_ZIP_MAX_ENTRIES = (1 << 16) - 1
+
+
+class ParallelZipWriter:
+    """
+    并行压缩的ZIP写入器，按 读取 -> 压缩 -> 写入 的流水线工作：
+    调用线程顺序读取图片，线程池并行计算CRC32和DEFLATE（zlib会释放GIL），
+    独立的写入线程按提交顺序写入本地文件头和数据，关闭时追加中央目录。
+    在途文件（已读取但尚未写入）的数量由信号量限制，多个写入器可共享同一个信号量
+    """
+
+    def __init__(self, file_path, compression=zipfile.ZIP_DEFLATED, compresslevel=None,
+                 executor=None, max_workers=None, inflight=None):
+        if compression not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise ValueError(f"不支持的压缩方式: {compression}")
+
+        self.file_path = file_path
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers or os.cpu_count())
+        self._entries = []
+        # 使用1 MiB写缓冲区，减少write系统调用次数
+        self._fp = open(file_path, "wb", buffering=1024 * 1024)
+
+        # 限制在途文件数量，避免整个章节同时驻留内存；写入线程写完一个文件后释放
+        self._inflight = inflight or BoundedSemaphore(2 * (max_workers or os.cpu_count()))
+        self._queue = queue.Queue()
+        self._writer_error = None
+        self._aborted = False
+        self._writer = Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._abort()
+
+    @staticmethod
+    def _compress_data(data, compression, compresslevel):
+        """计算CRC32并压缩单个文件的数据（在线程池中执行）"""
+        crc = deflate_backend.crc32(data)
+        if compression == zipfile.ZIP_DEFLATED:
+            if compresslevel is None:
+                level = deflate_backend.Z_DEFAULT_COMPRESSION
+            else:
+                # isa-l 只支持0-3级
+                level = min(compresslevel, deflate_backend.Z_BEST_COMPRESSION)
+            compressor = deflate_backend.compressobj(level, deflate_backend.DEFLATED, -15)
+            payload = compressor.compress(data) + compressor.flush()
+        else:
+            payload = data
+
+        return crc, len(data), payload
+
+    def write(self, file_path, arcname, compress_type=None):
+        """提交一个文件，压缩在后台进行；compress_type可覆盖默认压缩方式"""
+        compression = self.compression if compress_type is None else compress_type
+        if compression not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise ValueError(f"不支持的压缩方式: {compression}")
+
+        if self._writer_error is not None:
+            raise self._writer_error
+
+        # 读取在调用线程中顺序进行，保持磁盘读取的顺序性
+        self._inflight.acquire()
+        try:
+            zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+            with open(file_path, "rb") as f:
+                data = f.read()
+
+            future = self._executor.submit(self._compress_data, data, compression, self.compresslevel)
+        except BaseException:
+            self._inflight.release()
+            raise
+        self._queue.put((zinfo, compression, future))
+
+    def _write_loop(self):
+        """写入线程：按提交顺序等待压缩结果并写入文件"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            zinfo, compression, future = item
+            try:
+                # 出错或中止后只消费队列，不再写入
+                if self._writer_error is not None or self._aborted:
+                    future.cancel()
+                    continue
+
+                self._write_entry(zinfo, compression, *future.result())
+            except BaseException as e:
+                self._writer_error = e
+            finally:
+                self._inflight.release()
+
+    def _write_entry(self, zinfo, compression, crc, file_size, payload):
+        """写入本地文件头和压缩数据"""
+        try:
+            name = zinfo.filename.encode("ascii")
+            flag_bits = 0
+        except UnicodeEncodeError:
+            name = zinfo.filename.encode("utf-8")
+            flag_bits = 0x800
+
+        year, month, day, hour, minute, second = zinfo.date_time
+        dosdate = (year - 1980) << 9 | month << 5 | day
+        dostime = hour << 11 | minute << 5 | (second // 2)
+
+        compress_size = len(payload)
+        header_offset = self._fp.tell()
+        version = zipfile.DEFAULT_VERSION
+
+        extra = b""
+        header_file_size = file_size
+        header_compress_size = compress_size
+        if file_size > _ZIP64_LIMIT or compress_size > _ZIP64_LIMIT:
+            extra = struct.pack("<HHQQ", 1, 16, file_size, compress_size)
+            header_file_size = header_compress_size = 0xFFFFFFFF
+            version = max(version, zipfile.ZIP64_VERSION)
+
+        self._fp.write(_LOCAL_FILE_HEADER.pack(
+            b"PK\x03\x04", version, 0, flag_bits, compression, dostime, dosdate,
+            crc, header_compress_size, header_file_size, len(name), len(extra)
+        ))
+        self._fp.write(name)
+        self._fp.write(extra)
+        self._fp.write(payload)
+
+        self._entries.append((name, flag_bits, compression, dostime, dosdate, crc,
+                              compress_size, file_size, header_offset, version,
+                              zinfo.create_system, zinfo.external_attr))
+
+    def _write_central_directory(self):
+        """写入中央目录和目录结束记录"""
+        central_dir_offset = self._fp.tell()
+
+        for (name, flag_bits, compression, dostime, dosdate, crc, compress_size,
+             file_size, header_offset, version, create_system, external_attr) in self._entries:
+            zip64_fields = []
+            if file_size > _ZIP64_LIMIT:
+                zip64_fields.append(file_size)
+                file_size = 0xFFFFFFFF
+            if compress_size > _ZIP64_LIMIT:
+                zip64_fields.append(compress_size)
+                compress_size = 0xFFFFFFFF
+            if header_offset > _ZIP64_LIMIT:
+                zip64_fields.append(header_offset)
+                header_offset = 0xFFFFFFFF
+
+            extra = b""
+            if zip64_fields:
+                extra = struct.pack(f"<HH{len(zip64_fields)}Q", 1, 8 * len(zip64_fields), *zip64_fields)
+                version = max(version, zipfile.ZIP64_VERSION)
+
+            self._fp.write(_CENTRAL_DIR_HEADER.pack(
+                b"PK\x01\x02", version, create_system, version, 0, flag_bits, compression,
+                dostime, dosdate, crc, compress_size, file_size, len(name), len(extra),
+                0, 0, 0, external_attr, header_offset
+            ))
+            self._fp.write(name)
+            self._fp.write(extra)
+
+        central_dir_end = self._fp.tell()
+        central_dir_size = central_dir_end - central_dir_offset
+        entry_count = len(self._entries)
+
+        if (entry_count > _ZIP_MAX_ENTRIES or central_dir_offset > _ZIP64_LIMIT
+                or central_dir_size > _ZIP64_LIMIT):
+            self._fp.write(_ZIP64_END_OF_CENTRAL_DIR.pack(
+                b"PK\x06\x06", _ZIP64_END_OF_CENTRAL_DIR.size - 12, zipfile.ZIP64_VERSION,
+                zipfile.ZIP64_VERSION, 0, 0, entry_count, entry_count,
+                central_dir_size, central_dir_offset
+            ))
+            self._fp.write(_ZIP64_END_LOCATOR.pack(b"PK\x06\x07", 0, central_dir_end, 1))
+            entry_count = min(entry_count, 0xFFFF)
+            central_dir_size = min(central_dir_size, 0xFFFFFFFF)
+            central_dir_offset = min(central_dir_offset, 0xFFFFFFFF)
+
+        self._fp.write(_END_OF_CENTRAL_DIR.pack(
+            b"PK\x05\x06", 0, 0, entry_count, entry_count,
+            central_dir_size, central_dir_offset, 0
+        ))
+
+    def close(self):
+        """等待写入线程写完剩余文件，追加中央目录并关闭ZIP文件"""
+        self._queue.put(None)
+        self._writer.join()
+
+        try:
+            if self._writer_error is not None:
+                raise self._writer_error
+            self._write_central_directory()
+        finally:
+            self._fp.close()
+            if self._own_executor:
+                self._executor.shutdown()
+
+    def _abort(self):
+        """出错时丢弃未完成的压缩并关闭文件"""
+        self._aborted = True
+        self._queue.put(None)
+        self._writer.join()
+        self._fp.close()
+        if self._own_executor:
+            self._executor.shutdown(cancel_futures=True)
+
 
 class CompressionTask:
     """表示单个压缩任务的类"""
 
+    # 使用固定属性布局，减少大量任务时的内存占用
+    __slots__ = (
+        'source_path', 'target_path', 'preserve_timestamp', 'compression_level', 'compresslevel',
+        'rename_pattern', 'hash_algorithm', 'status', 'error', 'start_time',
+        'end_time', 'image_count', 'original_size', 'compressed_size', 'checksum',
+        'ext_counts', 'estimated_size', 'estimated_images', 'compute_checksum'
+    )
+
+    # 已经过熵编码的图片格式，再做DEFLATE几乎不能减小体积，直接存储
+    _stored_exts = frozenset({'jpg', 'jpeg', 'png', 'gif', 'webp', 'heic', 'jfif'})
+
     def __init__(self, source_path, target_path, preserve_timestamp=True,
-                 compression_level=zipfile.ZIP_DEFLATED, rename_pattern=None):
+                 compression_level=zipfile.ZIP_DEFLATED, rename_pattern=None,
+                 hash_algorithm="sha256", compresslevel=1, estimated_size=0,
+                 compute_checksum=False, estimated_images=0):
         self.source_path = source_path
         self.target_path = target_path
         self.preserve_timestamp = preserve_timestamp
         self.compression_level = compression_level
+        # DEFLATE压缩级别（1-9），默认1级：CPU开销约为默认级别的一半，压缩率几乎不变
+        self.compresslevel = compresslevel
         self.rename_pattern = rename_pattern
+        # 是否计算压缩包校验码（需要额外完整读取一遍压缩包，默认关闭）
+        self.compute_checksum = compute_checksum
+        # 校验算法，默认SHA-256；"md5"用于兼容旧的校验清单
+        self.hash_algorithm = hash_algorithm
         self.status = "pending"
         self.error = None
         self.start_time = None
@@ -29,7 +277,19 @@ class CompressionTask:
         self.image_count = 0
         self.original_size = 0
         self.compressed_size = 0
-        self.md5 = None
+        self.checksum = None
+        # 各类型图片的数量，如 {".jpg": 120}
+        self.ext_counts = {}
+        # 压缩前预估的源目录大小，用于调度时优先处理大章节
+        self.estimated_size = estimated_size
+        # 扫描时统计的图片数量，用于计算总进度
+        self.estimated_images = estimated_images
+
+    def compress_type_for(self, file_name):
+        """根据文件类型选择压缩方式，只有BMP/TIFF/ICO等格式使用DEFLATE"""
+        if file_suffix(file_name) in self._stored_exts:
+            return zipfile.ZIP_STORED
+        return self.compression_level
 
     def to_dict(self):
         """将任务信息转换为字典格式"""
@@ -45,101 +305,129 @@ class CompressionTask:
             "original_size": self.original_size,
             "compressed_size": self.compressed_size,
             "compression_ratio": self.original_size / self.compressed_size if self.compressed_size else 0,
-            "md5": self.md5
+            "hash_algorithm": self.hash_algorithm,
+            "checksum": self.checksum,
+            "ext_counts": self.ext_counts
         }
 
 
 class CompressionManager:
     """管理压缩任务的类"""
 
-    def __init__(self, max_workers=None, update_callback=None):
+    def __init__(self, max_workers=None, update_callback=None, update_interval=1 / 30):
         self.max_workers = max_workers or os.cpu_count()
+        # 回调参数为 (进度, 自上次回调以来完成的任务列表)
         self.update_callback = update_callback
+        # 合并进度回调的最小间隔（秒），避免大量小任务时回调过于频繁
+        self.update_interval = update_interval
+        self._pending_updates = []
+        self._update_timer = None
         self.tasks = []
         self.completed_tasks = 0
         self.total_tasks = 0
         self.running = False
         self.paused = False
         self.lock = Lock()
+        # 未暂停时处于set状态，暂停时工作线程在文件之间等待
+        self._resume_event = Event()
+        self._resume_event.set()
         self.executor = None
         self.futures = []
+        # 单个文件的DEFLATE线程池，由所有任务共享；启动时创建，批次结束或取消时关闭
+        self.deflate_executor = None
+        # 所有任务共享的在途文件上限，同时运行多个章节时内存占用也只与线程数成正比
+        self._inflight = BoundedSemaphore(2 * self.max_workers)
 
-        # 图片文件扩展名检测
-        self.image_extensions = {
-            '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp',
-            '.tiff', '.tif', '.ico', '.jfif', '.heic'
-        }
-
-        # 用于重命名的正则表达式
-        self.number_only_pattern = re.compile(r'^(\d+)\.zip$')
-
-    def is_image_file(self, filename):
+    @staticmethod
+    def is_image_file(filename):
         """检查文件是否为图片文件"""
-        return os.path.splitext(filename.lower())[1] in self.image_extensions
+        return is_image_name(filename)
+
+    def _iter_images(self, directory):
+        """
+        递归遍历目录中的图片文件（顺序与os.walk一致）
+        生成: (文件路径, 文件名, 文件大小)
+        """
+        subdirs = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir():
+                    # 与os.walk相同，不进入符号链接目录
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                elif self.is_image_file(entry.name):
+                    yield entry.path, entry.name, entry.stat().st_size
+
+        for subdir in subdirs:
+            yield from self._iter_images(subdir)
 
     def count_images_in_directory(self, directory):
         """计算目录中图片文件的数量和总大小"""
         count = 0
         total_size = 0
         try:
-            for root, _, files in os.walk(directory):
-                for file in files:
-                    if self.is_image_file(file):
-                        count += 1
-                        file_path = os.path.join(root, file)
-                        total_size += os.path.getsize(file_path)
+            for _, _, file_size in self._iter_images(directory):
+                count += 1
+                total_size += file_size
         except Exception as e:
             logger.error(f"计算图片时出错: {e}")
         return count, total_size
 
-    def calculate_md5(self, file_path):
-        """计算文件的MD5哈希值"""
-        hash_md5 = hashlib.md5()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+    def calculate_checksum(self, file_path, algorithm="sha256"):
+        """计算文件的校验码（默认SHA-256），出错时抛出异常，由调用方将任务标记为失败"""
+        return calculate_file_hash(file_path, algorithm, raise_errors=True)
 
     def compress_directory(self, task):
         """压缩目录到ZIP文件"""
+        # 暂停期间不开始新任务
+        self._resume_event.wait()
         task.start_time = time.time()
         task.status = "running"
 
         try:
-            # 计算图片数量和总大小
-            task.image_count, task.original_size = self.count_images_in_directory(task.source_path)
-
             # 获取源目录的时间戳
             src_mtime = os.path.getmtime(task.source_path)
 
-            # 创建临时目标路径，避免直接覆盖
-            temp_target_path = f"{task.target_path}.temp"
-
-            # 创建ZIP文件
-            with zipfile.ZipFile(temp_target_path, 'w', task.compression_level) as zipf:
-                # 直接添加图片文件，不保留目录结构
-                for root, _, files in os.walk(task.source_path):
-                    for file in files:
-                        if self.is_image_file(file):
-                            file_path = os.path.join(root, file)
-                            # 将文件添加到ZIP的根目录下
-                            zipf.write(file_path, arcname=file)
-
             # 检查是否需要重命名
             final_target_path = task.target_path
             if task.rename_pattern:
                 base_name = os.path.basename(task.target_path)
-                match = self.number_only_pattern.match(base_name)
-                if match:
-                    # 如果文件名只包含数字，则重命名为"第X章.zip"
-                    number = match.group(1)
+                number = base_name[:-4] if base_name.endswith('.zip') else ''
+                # 如果文件名只包含数字，则重命名为"第X章.zip"
+                # isdecimal与正则中的\d匹配同样的字符
+                if number.isdecimal():
                     new_name = f"第{number}章.zip"
                     final_target_path = os.path.join(os.path.dirname(task.target_path), new_name)
 
-            # 将临时文件重命名为最终文件
-            if os.path.exists(final_target_path):
-                os.remove(final_target_path)
-            os.rename(temp_target_path, final_target_path)
+            # 创建临时目标路径，避免直接覆盖
+            temp_target_path = f"{task.target_path}.temp"
+
+            # 创建ZIP文件，同时统计图片数量和总大小（只遍历一次目录）
+            image_count = 0
+            original_size = 0
+            ext_counts = {}
+            with ParallelZipWriter(temp_target_path, task.compression_level, task.compresslevel,
+                                   executor=self.deflate_executor,
+                                   max_workers=self.max_workers,
+                                   inflight=self._inflight) as zipf:
+                # 直接添加图片文件，不保留目录结构
+                for file_path, file_name, file_size in self._iter_images(task.source_path):
+                    # 暂停时在文件之间等待，已写入的数据保留在临时文件中
+                    self._resume_event.wait()
+                    # 将文件添加到ZIP的根目录下
+                    zipf.write(file_path, arcname=file_name,
+                               compress_type=task.compress_type_for(file_name))
+                    image_count += 1
+                    original_size += file_size
+                    ext = f".{file_suffix(file_name)}"
+                    ext_counts[ext] = ext_counts.get(ext, 0) + 1
+
+            task.image_count = image_count
+            task.original_size = original_size
+            task.ext_counts = ext_counts
+
+            # 将临时文件原子地替换为最终文件（目标已存在时直接覆盖）
+            os.replace(temp_target_path, final_target_path)
 
             # 更新任务目标路径（如果发生了重命名）
             task.target_path = final_target_path
@@ -148,8 +436,9 @@ class CompressionManager:
             if task.preserve_timestamp:
                 os.utime(final_target_path, (src_mtime, src_mtime))
 
-            # 计算MD5和压缩后大小
-            task.md5 = self.calculate_md5(final_target_path)
+            # 计算校验码和压缩后大小
+            if task.compute_checksum:
+                task.checksum = self.calculate_checksum(final_target_path, task.hash_algorithm)
             task.compressed_size = os.path.getsize(final_target_path)
 
             # 移除原目录
@@ -166,14 +455,24 @@ class CompressionManager:
         return task
 
     def add_task(self, source_path, target_path, preserve_timestamp=True,
-                 compression_level=zipfile.ZIP_DEFLATED, rename_pattern=None):
-        """添加压缩任务"""
+                 compression_level=zipfile.ZIP_DEFLATED, rename_pattern=None,
+                 hash_algorithm="sha256", compresslevel=1, estimated_size=0,
+                 compute_checksum=False, estimated_images=0):
+        """
+        添加压缩任务
+        estimated_size/estimated_images为扫描时统计的源目录大小和图片数量，用于调度和进度显示
+        """
         task = CompressionTask(
             source_path=source_path,
             target_path=target_path,
             preserve_timestamp=preserve_timestamp,
             compression_level=compression_level,
-            rename_pattern=rename_pattern
+            rename_pattern=rename_pattern,
+            hash_algorithm=hash_algorithm,
+            compresslevel=compresslevel,
+            estimated_size=estimated_size,
+            compute_checksum=compute_checksum,
+            estimated_images=estimated_images
         )
         self.tasks.append(task)
         return task
@@ -191,58 +490,95 @@ class CompressionManager:
         if self.total_tasks == 0:
             return
 
+        # 提交所有任务
+        self._submit_pending()
+
+    def _submit_pending(self):
+        """提交所有待处理任务"""
         self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.deflate_executor = ThreadPoolExecutor(max_workers=self.max_workers)
         self.futures = []
 
-        # 提交所有任务
-        for task in self.tasks:
-            if task.status == "pending":
-                future = self.executor.submit(self.compress_directory, task)
-                future.add_done_callback(self._task_completed)
-                self.futures.append(future)
+        # 最长任务优先：大章节先开始，空闲线程从共享队列取下一个任务，
+        # 避免批次末尾只剩一个大章节拖慢整体完成时间
+        pending = [task for task in self.tasks if task.status == "pending"]
+        pending.sort(key=lambda task: task.estimated_size, reverse=True)
+
+        for task in pending:
+            future = self.executor.submit(self.compress_directory, task)
+            future.add_done_callback(self._task_completed)
+            self.futures.append(future)
 
     def _task_completed(self, future):
         """任务完成回调"""
         with self.lock:
             self.completed_tasks += 1
-            progress = self.completed_tasks / self.total_tasks
 
-            # 如果有回调函数，通知进度更新
+            # 批次结束（包括取消后仍在运行的任务结束）时关闭DEFLATE线程池
+            if self.completed_tasks >= self.total_tasks:
+                self._shutdown_deflate_executor()
+
+            # 如果有回调函数，合并后通知进度更新
             if self.update_callback:
-                task = future.result()
-                self.update_callback(progress, task)
+                self._pending_updates.append(future.result())
+
+                if self.completed_tasks >= self.total_tasks:
+                    # 最后一个任务立即通知
+                    self._flush_updates_locked()
+                elif self._update_timer is None:
+                    self._update_timer = Timer(self.update_interval, self._flush_updates)
+                    self._update_timer.daemon = True
+                    self._update_timer.start()
+
+    def _flush_updates(self):
+        """定时器回调：一次性通知期间完成的所有任务"""
+        with self.lock:
+            self._flush_updates_locked()
+
+    def _flush_updates_locked(self):
+        """通知待发送的进度更新（调用方需持有锁）"""
+        if self._update_timer is not None:
+            self._update_timer.cancel()
+            self._update_timer = None
+
+        if not self._pending_updates:
+            return
+
+        tasks = self._pending_updates
+        self._pending_updates = []
+        self.update_callback(self.completed_tasks / self.total_tasks, tasks)
+
+    def _shutdown_deflate_executor(self):
+        """关闭DEFLATE线程池（已提交的压缩会继续完成）"""
+        if self.deflate_executor:
+            self.deflate_executor.shutdown(wait=False)
 
     def pause(self):
-        """暂停所有任务"""
+        """暂停所有任务（进行中的任务在当前文件写完后等待）"""
         self.paused = True
-        if self.executor:
-            self.executor.shutdown(wait=False, cancel_futures=True)
-            self.executor = None
+        self._resume_event.clear()
 
     def resume(self):
         """恢复暂停的任务"""
         if not self.paused:
             return
 
-        # 重新启动未完成的任务
-        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
-        self.futures = []
-
-        for task in self.tasks:
-            if task.status == "pending":
-                future = self.executor.submit(self.compress_directory, task)
-                future.add_done_callback(self._task_completed)
-                self.futures.append(future)
-
         self.paused = False
+        self._resume_event.set()
 
     def cancel(self):
         """取消所有任务"""
         self.running = False
+        # 唤醒暂停中的工作线程，使线程池可以结束
+        self._resume_event.set()
         if self.executor:
             self.executor.shutdown(wait=False, cancel_futures=True)
             self.executor = None
 
+        # 没有仍在运行的任务时直接关闭DEFLATE线程池，否则由最后结束的任务关闭
+        if all(future.done() for future in self.futures):
+            self._shutdown_deflate_executor()
+
         # 重置所有未完成任务的状态
         for task in self.tasks:
             if task.status == "running":
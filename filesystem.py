@@ -2,122 +2,182 @@ import os
 import logging
 import time
 from pathlib import Path
-from typing import List, Tuple, Dict, Set, Optional, Callable
+from typing import List, Tuple, Dict, Set, Optional, Callable, NamedTuple
+
+# 导入其他模块
+from utils import is_image_name
 
 logger = logging.getLogger("ComicCompressor")
 
 
+class Chapter(NamedTuple):
+    """扫描到的章节目录"""
+    title_dir: str  # 漫画标题目录
+    dir_path: str  # 章节目录
+    name: str  # 章节目录名
+    image_count: int = 0  # 章节目录（包括子目录）中的图片数量
+    image_size: int = 0  # 章节目录（包括子目录）中的图片总大小
+
+
 class FileSystemScanner:
     """用于扫描文件系统并识别需要压缩的目录的类"""
 
     def __init__(self, max_depth: int = 10):
         self.max_depth = max_depth
-        # 图片文件扩展名集合
-        self.image_extensions = {
-            '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp',
-            '.tiff', '.tif', '.ico', '.jfif', '.heic'
-        }
         # 排除的目录名
-        self.excluded_dirs = {'.git', '__pycache__', '.svn', 'node_modules', '.vscode'}
+        self.excluded_dirs = frozenset({'.git', '__pycache__', '.svn', 'node_modules', '.vscode'})
         # 已发现的章节缓存，用于避免重复扫描
         self.chapter_cache = {}
+        # 目录是否包含未排除的子目录，与chapter_cache同时记录
+        self.subdir_cache = {}
 
-    def is_image_file(self, file_path: str) -> bool:
+    @staticmethod
+    def is_image_file(file_name: str) -> bool:
         """检查文件是否为图片文件"""
-        return os.path.splitext(file_path.lower())[1] in self.image_extensions
+        return is_image_name(file_name)
 
-    def is_chapter_directory(self, dir_path: str) -> bool:
-        """检查目录是否为漫画章节目录（包含图片的最底层目录）"""
+    def _scan_directory(self, dir_path: str, with_size: bool = False) -> Tuple[int, int, List[os.DirEntry]]:
+        """
+        对目录执行一次scandir，同时完成图片统计和子目录收集
+        with_size为False时不获取文件大小，避免对每个图片调用stat
+        返回: (直接包含的图片数量, 图片总大小, 未排除的子目录列表)
+        """
+        image_count = 0
+        image_size = 0
+        subdirs = []
+        excluded = self.excluded_dirs
+
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    if entry.name not in excluded:
+                        subdirs.append(entry)
+                elif self.is_image_file(entry.name) and entry.is_file():
+                    image_count += 1
+                    if with_size:
+                        image_size += entry.stat().st_size
+
+        return image_count, image_size, subdirs
+
+    def inspect_directory(self, dir_path: str) -> Tuple[bool, bool]:
+        """
+        检查目录是否为章节目录，以及是否包含未排除的子目录
+        返回: (是否为章节目录, 是否有子目录)
+        """
         # 如果已经在缓存中，直接返回结果
-        if dir_path in self.chapter_cache:
-            return self.chapter_cache[dir_path]
-
-        # 检查目录是否直接包含图片
-        has_images = False
-        has_subdirs = False
+        if dir_path in self.chapter_cache and dir_path in self.subdir_cache:
+            return self.chapter_cache[dir_path], self.subdir_cache[dir_path]
 
         try:
-            for item in os.scandir(dir_path):
-                if item.is_file() and self.is_image_file(item.name):
-                    has_images = True
-                elif item.is_dir() and item.name not in self.excluded_dirs:
-                    has_subdirs = True
-
-                    # 如果已经找到图片和子目录，不需要继续扫描
-                    if has_images:
-                        break
+            image_count, _, subdirs = self._scan_directory(dir_path)
         except (PermissionError, FileNotFoundError) as e:
             logger.warning(f"无法访问目录 {dir_path}: {e}")
             self.chapter_cache[dir_path] = False
-            return False
-
-        # 如果目录直接包含图片，但不包含子目录，则认为是章节目录
-        result = has_images and not has_subdirs
+            self.subdir_cache[dir_path] = False
+            return False, False
 
-        # 如果目录包含子目录，需要检查是否这些子目录包含图片
-        if has_images and has_subdirs:
-            # 章节目录可能包含子目录（如"pages"），但仍然是最底层的章节目录
-            result = True
+        # 直接包含图片即为章节目录
+        # 章节目录可能包含子目录（如"pages"），但仍然是最底层的章节目录
+        has_images = image_count > 0
+        has_subdirs = bool(subdirs)
+        self.chapter_cache[dir_path] = has_images
+        self.subdir_cache[dir_path] = has_subdirs
+        return has_images, has_subdirs
 
-        # 缓存结果
-        self.chapter_cache[dir_path] = result
-        return result
+    def is_chapter_directory(self, dir_path: str) -> bool:
+        """检查目录是否为漫画章节目录（包含图片的最底层目录）"""
+        if dir_path in self.chapter_cache:
+            return self.chapter_cache[dir_path]
+        return self.inspect_directory(dir_path)[0]
 
     def scan_for_comic_directories(self,
                                    root_path: str,
-                                   progress_callback: Optional[Callable[[float, str], None]] = None) -> List[
-        Tuple[str, str, str]]:
+                                   progress_callback: Optional[Callable[[int, str], None]] = None) -> List[
+        Chapter]:
         """
         扫描漫画目录，寻找需要压缩的章节目录
-        返回格式: [(漫画标题目录, 章节目录, 相对目录名)]
+        返回格式: [(漫画标题目录, 章节目录, 相对目录名, 图片数量, 图片总大小)]
+        图片数量和大小包括章节目录下的子目录，在扫描的同时统计，压缩前不需要再遍历一次
+        progress_callback参数为 (已扫描目录数, 状态文本)；只遍历一次，总目录数未知，不提供进度比例
         """
         comic_chapters = []
-        total_dirs = 0
         processed_dirs = 0
 
-        # 首先计算总目录数以便更新进度
-        for root, dirs, _ in os.walk(root_path):
-            total_dirs += len(dirs)
-
-            # 从扫描中排除不需要的目录
-            dirs[:] = [d for d in dirs if d not in self.excluded_dirs]
+        def scan(subdirs: List[os.DirEntry], depth: int) -> Tuple[int, int]:
+            """扫描一组目录，返回这些目录的整个子树中的图片数量和总大小"""
+            nonlocal processed_dirs
 
             # 限制递归深度
-            if root.count(os.sep) - root_path.count(os.sep) >= self.max_depth:
-                dirs[:] = []
-
-        logger.info(f"扫描到 {total_dirs} 个目录")
+            if depth >= self.max_depth:
+                return 0, 0
 
-        # 开始实际扫描
-        for root, dirs, _ in os.walk(root_path):
-            # 排除不需要的目录
-            dirs[:] = [d for d in dirs if d not in self.excluded_dirs]
+            total_count = 0
+            total_size = 0
+            children = []
 
-            # 限制递归深度
-            if root.count(os.sep) - root_path.count(os.sep) >= self.max_depth:
-                dirs[:] = []
-                continue
-
-            for dir_name in dirs:
-                dir_path = os.path.join(root, dir_name)
+            for entry in subdirs:
                 processed_dirs += 1
 
                 # 更新进度
-                if progress_callback and total_dirs > 0:
-                    progress = processed_dirs / total_dirs
-                    progress_callback(progress, f"扫描: {dir_path}")
+                if progress_callback:
+                    progress_callback(processed_dirs, f"扫描: {entry.path}")
 
-                # 检查是否为章节目录
-                if self.is_chapter_directory(dir_path):
+                # 一次scandir同时判断章节目录并取得下一层子目录
+                try:
+                    image_count, image_size, child_subdirs = self._scan_directory(entry.path, with_size=True)
+                except (PermissionError, FileNotFoundError) as e:
+                    logger.warning(f"无法访问目录 {entry.path}: {e}")
+                    self.chapter_cache[entry.path] = False
+                    self.subdir_cache[entry.path] = False
+                    continue
+
+                has_images = image_count > 0
+                self.chapter_cache[entry.path] = has_images
+                self.subdir_cache[entry.path] = bool(child_subdirs)
+                total_count += image_count
+                total_size += image_size
+
+                chapter_index = None
+                if has_images:
                     # 找到章节目录，确定漫画标题目录
                     # 假设章节目录的父目录是漫画标题目录
-                    comic_title_dir = os.path.dirname(dir_path)
-                    comic_chapters.append((comic_title_dir, dir_path, dir_name))
+                    comic_title_dir = os.path.dirname(entry.path)
+                    chapter_index = len(comic_chapters)
+                    comic_chapters.append(Chapter(comic_title_dir, entry.path, entry.name,
+                                                  image_count, image_size))
+
+                # 与os.walk相同，不进入符号链接目录
+                if not entry.is_symlink():
+                    children.append((chapter_index, child_subdirs))
+
+            for chapter_index, child_subdirs in children:
+                child_count, child_size = scan(child_subdirs, depth + 1)
+                total_count += child_count
+                total_size += child_size
+
+                # 章节目录的统计包括其子目录中的图片
+                if chapter_index is not None and child_count:
+                    chapter = comic_chapters[chapter_index]
+                    comic_chapters[chapter_index] = chapter._replace(
+                        image_count=chapter.image_count + child_count,
+                        image_size=chapter.image_size + child_size
+                    )
+
+            return total_count, total_size
+
+        try:
+            _, _, root_subdirs = self._scan_directory(root_path)
+        except OSError as e:
+            logger.warning(f"无法访问目录 {root_path}: {e}")
+            return comic_chapters
+
+        scan(root_subdirs, 0)
 
+        logger.info(f"扫描到 {processed_dirs} 个目录")
         return comic_chapters
 
     def prepare_compression_tasks(self,
-                                  chapters: List[Tuple[str, str, str]],
+                                  chapters: List[Chapter],
                                   rename_pattern: bool = False) -> List[Tuple[str, str]]:
         """
         准备压缩任务列表
@@ -125,10 +185,10 @@ class FileSystemScanner:
         """
         tasks = []
 
-        for comic_title_dir, chapter_dir, chapter_name in chapters:
+        for chapter in chapters:
             # 构建目标ZIP文件路径
-            target_zip = os.path.join(comic_title_dir, f"{chapter_name}.zip")
-            tasks.append((chapter_dir, target_zip))
+            target_zip = os.path.join(chapter.title_dir, f"{chapter.name}.zip")
+            tasks.append((chapter.dir_path, target_zip))
 
         return tasks
 
@@ -19,6 +19,9 @@ def main():
     parser.add_argument('--log', type=str, default='comic_compressor.log', help='日志文件路径')
     parser.add_argument('--debug', action='store_true', help='启用调试日志')
     parser.add_argument('--theme', type=str, default='light_blue.xml', help='UI主题')
+    parser.add_argument('--checksum', action='store_true', help='计算压缩包校验码并写入报告')
+    parser.add_argument('--hash', type=str, default='sha256', choices=['sha256', 'md5'],
+                        help='压缩包校验算法（md5用于兼容旧的校验清单）')
     args = parser.parse_args()
 
     # 设置日志
@@ -62,6 +65,8 @@ def main():
 
     # 创建并显示主窗口
     window = MainWindow()
+    window.compute_checksum = args.checksum
+    window.hash_algorithm = args.hash
     window.show()
 
     # 如果命令行指定了目录，设置根目录
@@ -5,12 +5,22 @@ from datetime import datetime
 
 logger = logging.getLogger("ComicCompressor")
 
+# 章节明细表的列
+DETAIL_COLUMNS = (
+    "漫画标题", "原章节名称", "压缩文件名", "图片总数", "压缩前大小(MB)",
+    "压缩后大小(MB)", "压缩比例", "压缩时间", "耗时(秒)", "校验算法",
+    "校验码", "原始路径", "状态", "错误信息"
+)
+
 
 class ReportGenerator:
     """用于生成Excel报告的类"""
 
     def __init__(self):
-        self.task_results = []
+        # 按列存储任务结果，生成报告时一次性构建DataFrame
+        self.task_columns = {column: [] for column in DETAIL_COLUMNS}
+        # 已完成任务中各类型图片的数量
+        self.file_types = {}
         self.summary = {
             "total_comics": set(),
             "total_chapters": 0,
@@ -40,34 +50,40 @@ class ReportGenerator:
             self.summary["total_images"] += task.image_count
             self.summary["total_original_size"] += task.original_size
             self.summary["total_compressed_size"] += task.compressed_size
+            for ext, count in task.ext_counts.items():
+                self.file_types[ext] = self.file_types.get(ext, 0) + count
         elif task.status == "failed":
             self.summary["failed_tasks"] += 1
 
-        # 添加到任务结果列表
-        task_data = {
-            "漫画标题": os.path.basename(os.path.dirname(task.source_path)),
-            "原章节名称": os.path.basename(task.source_path),
-            "压缩文件名": os.path.basename(task.target_path),
-            "图片总数": task.image_count,
-            "压缩前大小(MB)": task.original_size / (1024 * 1024) if task.original_size else 0,
-            "压缩后大小(MB)": task.compressed_size / (1024 * 1024) if task.compressed_size else 0,
-            "压缩比例": task.compressed_size / task.original_size if task.original_size and task.compressed_size else 0,
-            "压缩时间": datetime.fromtimestamp(task.end_time).strftime("%Y-%m-%d %H:%M:%S") if task.end_time else "",
-            "耗时(秒)": task.end_time - task.start_time if task.end_time and task.start_time else 0,
-            "MD5校验码": task.md5 or "",
-            "原始路径": task.source_path,
-            "状态": task.status,
-            "错误信息": str(task.error) if task.error else ""
-        }
-        self.task_results.append(task_data)
+        # 添加到任务结果各列
+        columns = self.task_columns
+        columns["漫画标题"].append(os.path.basename(os.path.dirname(task.source_path)))
+        columns["原章节名称"].append(os.path.basename(task.source_path))
+        columns["压缩文件名"].append(os.path.basename(task.target_path))
+        columns["图片总数"].append(task.image_count)
+        columns["压缩前大小(MB)"].append(task.original_size / (1024 * 1024) if task.original_size else 0)
+        columns["压缩后大小(MB)"].append(task.compressed_size / (1024 * 1024) if task.compressed_size else 0)
+        columns["压缩比例"].append(
+            task.compressed_size / task.original_size if task.original_size and task.compressed_size else 0)
+        columns["压缩时间"].append(
+            datetime.fromtimestamp(task.end_time).strftime("%Y-%m-%d %H:%M:%S") if task.end_time else "")
+        columns["耗时(秒)"].append(task.end_time - task.start_time if task.end_time and task.start_time else 0)
+        columns["校验算法"].append(task.hash_algorithm.upper() if task.checksum else "")
+        columns["校验码"].append(task.checksum or "")
+        columns["原始路径"].append(task.source_path)
+        columns["状态"].append(task.status)
+        columns["错误信息"].append(str(task.error) if task.error else "")
 
     def generate_report(self, output_path):
         """生成Excel报告"""
+        columns = self.task_columns
+        has_results = bool(columns["状态"])
+
         try:
             with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
                 # 章节明细表
-                if self.task_results:
-                    df_details = pd.DataFrame(self.task_results)
+                if has_results:
+                    df_details = pd.DataFrame(columns)
                     df_details.sort_values(by=["漫画标题", "原章节名称"], inplace=True)
                     df_details.to_excel(writer, sheet_name="章节明细", index=False)
 
@@ -125,11 +141,12 @@ class ReportGenerator:
                 worksheet.column_dimensions['B'].width = 25
 
                 # 漫画标题统计表
-                if self.task_results:
+                if has_results:
                     # 按漫画标题分组统计
                     comic_stats = {}
-                    for task in self.task_results:
-                        title = task["漫画标题"]
+                    for title, status, image_count, original_mb, compressed_mb in zip(
+                            columns["漫画标题"], columns["状态"], columns["图片总数"],
+                            columns["压缩前大小(MB)"], columns["压缩后大小(MB)"]):
                         if title not in comic_stats:
                             comic_stats[title] = {
                                 "章节数": 0,
@@ -138,11 +155,11 @@ class ReportGenerator:
                                 "压缩后大小(MB)": 0
                             }
 
-                        if task["状态"] == "completed":
+                        if status == "completed":
                             comic_stats[title]["章节数"] += 1
-                            comic_stats[title]["图片总数"] += task["图片总数"]
-                            comic_stats[title]["原始大小(MB)"] += task["压缩前大小(MB)"]
-                            comic_stats[title]["压缩后大小(MB)"] += task["压缩后大小(MB)"]
+                            comic_stats[title]["图片总数"] += image_count
+                            comic_stats[title]["原始大小(MB)"] += original_mb
+                            comic_stats[title]["压缩后大小(MB)"] += compressed_mb
 
                     # 创建漫画标题统计数据框
                     comic_stats_data = []
@@ -171,31 +188,12 @@ class ReportGenerator:
                             ) + 2
                             worksheet.column_dimensions[chr(65 + i)].width = min(max_len, 30)
 
-                # 文件类型分布表
-                if self.task_results:
-                    # 统计图片类型
-                    file_types = {}
-                    for task in self.task_results:
-                        if task["状态"] != "completed":
-                            continue
-
-                        source_path = task["原始路径"]
-                        try:
-                            # 统计目录中各类型图片的数量
-                            for root, _, files in os.walk(source_path):
-                                for file in files:
-                                    ext = os.path.splitext(file.lower())[1]
-                                    if ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff', '.tif']:
-                                        file_types[ext] = file_types.get(ext, 0) + 1
-                        except:
-                            # 如果目录已被删除，无法统计
-                            pass
-
-                    if file_types:
-                        file_types_data = [{"文件类型": ext, "数量": count} for ext, count in file_types.items()]
-                        df_file_types = pd.DataFrame(file_types_data)
-                        df_file_types.sort_values(by=["数量"], ascending=False, inplace=True)
-                        df_file_types.to_excel(writer, sheet_name="文件类型分布", index=False)
+                # 文件类型分布表（压缩时已统计，源目录此时已被删除）
+                if self.file_types:
+                    file_types_data = [{"文件类型": ext, "数量": count} for ext, count in self.file_types.items()]
+                    df_file_types = pd.DataFrame(file_types_data)
+                    df_file_types.sort_values(by=["数量"], ascending=False, inplace=True)
+                    df_file_types.to_excel(writer, sheet_name="文件类型分布", index=False)
 
             logger.info(f"报告已生成: {output_path}")
             return True
@@ -1,6 +1,7 @@
 import sys
 import os
 import time
+import queue
 import threading
 import psutil
 from typing import List, Dict, Tuple, Optional
@@ -14,10 +15,11 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QTreeWidgetItem, QRadioButton, QGroupBox,
                              QLineEdit, QStatusBar, QStyle)
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QSize, QTimer, QModelIndex
-from PyQt5.QtGui import QIcon, QFont, QPixmap, QColor, QPalette, QStandardItemModel, QStandardItem
+from PyQt5.QtGui import (QIcon, QFont, QPixmap, QColor, QPalette, QStandardItemModel, QStandardItem,
+                         QTextCharFormat, QTextCursor)
 
 # 导入其他模块
-from compression import CompressionManager, CompressionTask
+from compression import CompressionManager
 from filesystem import FileSystemScanner, FileSystemWatcher
 from report import ReportGenerator
 import zipfile
@@ -26,32 +28,43 @@ logger = logging.getLogger("ComicCompressor")
 
 
 class SystemMonitor(QThread):
-    """系统资源监控线程"""
-    update_signal = pyqtSignal(dict)
+    """系统资源监控线程
+
+    采样结果原地写入 stats 字典，由界面的定时器读取，不再每次采样都发送信号。
+    """
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.running = False
         self.process = psutil.Process(os.getpid())
+        # CPU核心数在运行期间不会变化，只获取一次
+        self.cpu_count = psutil.cpu_count()
+        self.stats = {}
 
     def run(self):
         self.running = True
+        memory_percent = 0
+        tick = 0
         while self.running:
             try:
                 # 获取CPU和内存使用率
                 cpu_percent = psutil.cpu_percent(interval=None)
-                memory_percent = psutil.virtual_memory().percent
-                process_cpu_percent = self.process.cpu_percent() / psutil.cpu_count()
-                process_memory = self.process.memory_info().rss / (1024 * 1024)  # MB
-
-                stats = {
-                    'system_cpu': cpu_percent,
-                    'system_memory': memory_percent,
-                    'process_cpu': process_cpu_percent,
-                    'process_memory': process_memory
-                }
-
-                self.update_signal.emit(stats)
+                # 系统内存变化较慢，每5秒获取一次
+                if tick % 5 == 0:
+                    memory_percent = psutil.virtual_memory().percent
+                tick += 1
+
+                # oneshot让进程相关的指标共享同一次/proc读取
+                with self.process.oneshot():
+                    process_cpu_percent = self.process.cpu_percent() / self.cpu_count
+                    process_memory = self.process.memory_info().rss / (1024 * 1024)  # MB
+
+                self.stats.update(
+                    system_cpu=cpu_percent,
+                    system_memory=memory_percent,
+                    process_cpu=process_cpu_percent,
+                    process_memory=process_memory
+                )
                 time.sleep(1)
             except Exception as e:
                 logger.error(f"系统监控错误: {e}")
@@ -62,7 +75,10 @@ class SystemMonitor(QThread):
 
 
 class DirectoryStructureModel(QStandardItemModel):
-    """用于预览目录结构的模型"""
+    """用于预览目录结构的模型（节点展开时才加载其子目录）"""
+
+    # 节点的子目录是否已经加载
+    LOADED_ROLE = Qt.UserRole + 1
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -70,42 +86,68 @@ class DirectoryStructureModel(QStandardItemModel):
         self.scanner = FileSystemScanner()
 
     def load_directory(self, root_path):
-        """加载目录结构"""
+        """加载目录结构（只加载根目录的直接子目录）"""
         self.clear()
         self.setHorizontalHeaderLabels(["目录结构"])
 
-        root_item = self.invisibleRootItem()
-        self._load_directory_recursive(root_path, root_item, 0)
+        root_item = self._create_item(root_path, os.path.basename(root_path))
+        self.invisibleRootItem().appendRow(root_item)
+        if root_item.data(self.LOADED_ROLE) is False:
+            self._load_children(root_item)
+
+    def on_expanded(self, index):
+        """视图展开节点时加载其子目录"""
+        item = self.itemFromIndex(index)
+        if item is not None and item.data(self.LOADED_ROLE) is False:
+            self._load_children(item)
+
+    def _create_item(self, path, dir_name):
+        """创建目录节点，有子目录的非章节目录添加一个占位子节点以显示展开箭头"""
+        item = QStandardItem(dir_name)
+        item.setData(path, Qt.UserRole)
+
+        # 标记章节目录（判断结果由scanner缓存）
+        is_chapter, has_subdirs = self.scanner.inspect_directory(path)
+        if is_chapter:
+            item.setBackground(QColor(200, 255, 200))  # 浅绿色
+            item.setText(f"{dir_name} (将被压缩)")
+            item.setData(True, self.LOADED_ROLE)  # 不再展开章节目录
+        elif has_subdirs:
+            item.setData(False, self.LOADED_ROLE)
+            item.appendRow(QStandardItem())
+        else:
+            # 没有子目录，不需要展开
+            item.setData(True, self.LOADED_ROLE)
 
-    def _load_directory_recursive(self, path, parent_item, depth):
-        """递归加载目录结构"""
-        if depth > 3:  # 限制深度以避免UI卡顿
-            return
+        return item
+
+    def _load_children(self, item):
+        """移除占位节点，加载目录的直接子目录"""
+        item.removeRows(0, item.rowCount())
+        item.setData(True, self.LOADED_ROLE)
 
+        path = item.data(Qt.UserRole)
+        children = []
+        # 循环中使用局部变量，避免重复的属性查找
+        excluded = self.scanner.excluded_dirs
+        create_item = self._create_item
         try:
-            dir_name = os.path.basename(path)
-            item = QStandardItem(dir_name)
-            item.setData(path, Qt.UserRole)
-            parent_item.appendRow(item)
-
-            # 标记章节目录
-            if self.scanner.is_chapter_directory(path):
-                item.setBackground(QColor(200, 255, 200))  # 浅绿色
-                item.setText(f"{dir_name} (将被压缩)")
-                return  # 不再展开章节目录
-
-            # 加载子目录
-            for entry in os.scandir(path):
-                if entry.is_dir() and entry.name not in self.scanner.excluded_dirs:
-                    self._load_directory_recursive(entry.path, item, depth + 1)
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir() and entry.name not in excluded:
+                        children.append(create_item(entry.path, entry.name))
         except (PermissionError, FileNotFoundError) as e:
             logger.warning(f"无法访问目录 {path}: {e}")
 
+        # 一次性插入所有子节点，只触发一次rowsInserted
+        if children:
+            item.appendRows(children)
+
 
 class CompressionWorker(QThread):
     """压缩工作线程"""
-    progress_signal = pyqtSignal(float, CompressionTask)
-    scanning_signal = pyqtSignal(float, str)
+    progress_signal = pyqtSignal(float, list)
+    scanning_signal = pyqtSignal(int, str)
     completed_signal = pyqtSignal()
     error_signal = pyqtSignal(str)
 
@@ -113,9 +155,12 @@ class CompressionWorker(QThread):
         super().__init__(parent)
         self.root_path = None
         self.compression_level = zipfile.ZIP_DEFLATED
+        self.compresslevel = 1
         self.preserve_timestamp = True
         self.rename_pattern = False
         self.max_workers = os.cpu_count()
+        self.hash_algorithm = "sha256"
+        self.compute_checksum = False
         self.running = False
         self.manager = None
         self.paused = False
@@ -123,21 +168,28 @@ class CompressionWorker(QThread):
         self.processed_images = 0
         self.start_time = None
         self.end_time = None
+        # 所有任务完成或取消时置位
+        self._done_event = threading.Event()
 
     def configure(self, root_path, compression_level, preserve_timestamp,
-                  rename_pattern, max_workers):
+                  rename_pattern, max_workers, hash_algorithm="sha256", compresslevel=1,
+                  compute_checksum=False):
         """配置压缩任务"""
         self.root_path = root_path
         self.compression_level = compression_level
+        self.compresslevel = compresslevel
         self.preserve_timestamp = preserve_timestamp
         self.rename_pattern = rename_pattern
         self.max_workers = max_workers
+        self.hash_algorithm = hash_algorithm
+        self.compute_checksum = compute_checksum
 
     def run(self):
         """执行压缩任务"""
         self.running = True
         self.paused = False
         self.start_time = time.time()
+        self._done_event.clear()
 
         try:
             # 初始化管理器
@@ -160,32 +212,30 @@ class CompressionWorker(QThread):
             # 准备任务
             tasks = scanner.prepare_compression_tasks(chapters, self.rename_pattern)
 
-            # 计算总图片数
+            # 添加任务，总图片数和章节大小使用扫描时的统计结果，不再单独遍历一次
             self.total_images = 0
-            for source_dir, _ in tasks:
-                image_count, _ = self.manager.count_images_in_directory(source_dir)
-                self.total_images += image_count
-
-            # 添加任务
-            for source_dir, target_zip in tasks:
+            for chapter, (source_dir, target_zip) in zip(chapters, tasks):
                 self.manager.add_task(
                     source_dir,
                     target_zip,
                     self.preserve_timestamp,
                     self.compression_level,
-                    self.rename_pattern
+                    self.rename_pattern,
+                    self.hash_algorithm,
+                    self.compresslevel,
+                    chapter.image_size,
+                    self.compute_checksum,
+                    chapter.image_count
                 )
+                self.total_images += chapter.image_count
 
             # 开始压缩
             self.manager.start()
 
-            # 等待完成
-            while self.running and self.manager.get_progress() < 1.0:
-                if self.paused:
-                    time.sleep(0.5)
-                    continue
-
-                time.sleep(0.1)
+            # 等待完成（线程阻塞在事件上，不再轮询进度）
+            while not self._done_event.wait(timeout=0.5):
+                if not self.running:
+                    break
 
             self.end_time = time.time()
 
@@ -198,14 +248,17 @@ class CompressionWorker(QThread):
 
         self.running = False
 
-    def _on_task_update(self, progress, task):
-        """任务更新回调"""
-        self.processed_images += task.image_count
-        self.progress_signal.emit(progress, task)
+    def _on_task_update(self, progress, tasks):
+        """任务更新回调（tasks为自上次回调以来完成的任务）"""
+        self.processed_images += sum(task.image_count for task in tasks)
+        self.progress_signal.emit(progress, tasks)
 
-    def _on_scanning_progress(self, progress, status):
+        if progress >= 1.0:
+            self._done_event.set()
+
+    def _on_scanning_progress(self, processed_dirs, status):
         """扫描进度回调"""
-        self.scanning_signal.emit(progress, status)
+        self.scanning_signal.emit(processed_dirs, status)
 
     def pause(self):
         """暂停任务"""
@@ -224,6 +277,7 @@ class CompressionWorker(QThread):
         self.running = False
         if self.manager:
             self.manager.cancel()
+        self._done_event.set()
 
 
 class MainWindow(QMainWindow):
@@ -238,15 +292,23 @@ class MainWindow(QMainWindow):
 
         # 初始化变量
         self.root_path = None
+        # 是否计算压缩包校验码，以及校验算法（sha256 或 md5）
+        self.compute_checksum = False
+        self.hash_algorithm = "sha256"
         self.report_generator = ReportGenerator()
         self.worker = None
         self.system_monitor = SystemMonitor()
-        self.system_monitor.update_signal.connect(self.update_system_stats)
         self.system_monitor.start()
 
         # 创建UI
         self.setup_ui()
 
+        # 所有周期性的状态栏刷新共用一个定时器
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setTimerType(Qt.PreciseTimer)
+        self.refresh_timer.timeout.connect(self.refresh_status_labels)
+        self.refresh_timer.start(1000)  # 每秒更新一次
+
     def setup_ui(self):
         """创建用户界面"""
         # 创建中央窗口部件
@@ -324,11 +386,12 @@ class MainWindow(QMainWindow):
         level_layout = QHBoxLayout()
         level_label = QLabel("压缩级别:")
         self.level_combo = QComboBox()
-        self.level_combo.addItem("存储 (不压缩)", zipfile.ZIP_STORED)
-        self.level_combo.addItem("快速 (低压缩率)", zipfile.ZIP_DEFLATED)
-        self.level_combo.addItem("适中 (平衡)", zipfile.ZIP_DEFLATED)
-        self.level_combo.addItem("最佳 (高压缩率)", zipfile.ZIP_DEFLATED)
-        self.level_combo.setCurrentIndex(2)  # 默认选择"适中"
+        # 选项数据为 (压缩方式, DEFLATE压缩级别)
+        self.level_combo.addItem("存储 (不压缩)", (zipfile.ZIP_STORED, 0))
+        self.level_combo.addItem("快速 (低压缩率)", (zipfile.ZIP_DEFLATED, 1))
+        self.level_combo.addItem("适中 (平衡)", (zipfile.ZIP_DEFLATED, 6))
+        self.level_combo.addItem("最佳 (高压缩率)", (zipfile.ZIP_DEFLATED, 9))
+        self.level_combo.setCurrentIndex(1)  # 默认选择"快速"
 
         level_layout.addWidget(level_label)
         level_layout.addWidget(self.level_combo)
@@ -426,6 +489,7 @@ class MainWindow(QMainWindow):
         self.tree_model = DirectoryStructureModel()
         self.tree_view = QTreeView()
         self.tree_view.setModel(self.tree_model)
+        self.tree_view.expanded.connect(self.tree_model.on_expanded)
         self.tree_view.setAnimated(True)
         self.tree_view.setHeaderHidden(False)
         self.tree_view.header().setSectionResizeMode(QHeaderView.Stretch)
@@ -442,7 +506,13 @@ class MainWindow(QMainWindow):
         self.log_text.setReadOnly(True)
 
         # 添加自定义处理程序以将日志消息重定向到文本区域
-        logger.addHandler(LogTextHandler(self.log_text))
+        self.log_handler = LogTextHandler(self.log_text)
+        logger.addHandler(self.log_handler)
+
+        # 定时在GUI线程中批量写入日志
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.log_handler.drain)
+        self.log_timer.start(200)
 
         layout.addWidget(self.log_text)
 
@@ -484,12 +554,25 @@ class MainWindow(QMainWindow):
         if not self.root_path:
             return
 
+        # 加载期间断开模型并暂停重绘，视图不逐行处理插入信号
+        # 每次setModel都会创建新的选择模型，旧的不会自动释放，重新连接后删除
+        old_selection_models = [self.tree_view.selectionModel()]
+        self.tree_view.setUpdatesEnabled(False)
         try:
+            self.tree_view.setModel(None)
+            old_selection_models.append(self.tree_view.selectionModel())
             self.tree_model.load_directory(self.root_path)
+            self.tree_view.setModel(self.tree_model)
             self.tree_view.expandToDepth(1)
         except Exception as e:
+            self.tree_view.setModel(self.tree_model)
             logger.error(f"加载目录预览失败: {e}")
             QMessageBox.warning(self, "错误", f"加载目录预览失败: {e}")
+        finally:
+            self.tree_view.setUpdatesEnabled(True)
+            for selection_model in old_selection_models:
+                if selection_model is not None:
+                    selection_model.deleteLater()
 
     def start_compression(self):
         """开始压缩任务"""
@@ -498,7 +581,7 @@ class MainWindow(QMainWindow):
             return
 
         # 获取选项
-        compression_level = self.level_combo.currentData()
+        compression_level, compresslevel = self.level_combo.currentData()
         preserve_timestamp = self.timestamp_check.isChecked()
         rename_pattern = self.rename_check.isChecked()
         max_workers = self.threads_spin.value()
@@ -510,7 +593,10 @@ class MainWindow(QMainWindow):
             compression_level,
             preserve_timestamp,
             rename_pattern,
-            max_workers
+            max_workers,
+            self.hash_algorithm,
+            compresslevel,
+            self.compute_checksum
         )
 
         # 连接信号
@@ -528,13 +614,8 @@ class MainWindow(QMainWindow):
         self.statusBar.showMessage("正在扫描文件系统...")
 
         # 开始任务
-        self.worker.start()
-
-        # 启动计时器
         self.start_time = time.time()
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_time)
-        self.timer.start(1000)  # 每秒更新一次
+        self.worker.start()
 
     def toggle_pause(self):
         """暂停/恢复任务"""
@@ -567,16 +648,21 @@ class MainWindow(QMainWindow):
             self.statusBar.showMessage("任务已取消")
             self.reset_ui_state()
 
-    def update_scanning_progress(self, progress, status):
-        """更新扫描进度"""
-        self.progress_bar.setValue(int(progress * 100))
+    def update_scanning_progress(self, processed_dirs, status):
+        """更新扫描进度（总目录数未知，进度条显示为忙碌状态）"""
+        if self.progress_bar.maximum() != 0:
+            self.progress_bar.setRange(0, 0)
+        self.statusBar.showMessage(f"正在扫描文件系统... 已扫描 {processed_dirs} 个目录")
         self.current_task_label.setText(status)
 
-    def update_progress(self, progress, task):
-        """更新压缩进度"""
+    def update_progress(self, progress, tasks):
+        """更新压缩进度（tasks为一批已完成的任务）"""
+        if self.progress_bar.maximum() == 0:
+            self.progress_bar.setRange(0, 100)
         self.progress_bar.setValue(int(progress * 100))
 
         # 更新当前任务标签
+        task = tasks[-1]
         if task.status == "completed":
             status_text = "完成"
         elif task.status == "failed":
@@ -591,8 +677,14 @@ class MainWindow(QMainWindow):
             self.images_label.setText(f"图片: {self.worker.processed_images}/{self.worker.total_images}")
 
         # 更新统计信息
-        if task.status == "completed":
-            self.update_stats(task)
+        completed = [task for task in tasks if task.status == "completed"]
+        if completed:
+            self.update_stats(completed)
+
+    def refresh_status_labels(self):
+        """定时刷新状态栏（耗时、剩余时间和资源占用）"""
+        self.update_time()
+        self.update_system_stats(self.system_monitor.stats)
 
     def update_time(self):
         """更新计时器"""
@@ -617,12 +709,15 @@ class MainWindow(QMainWindow):
 
     def update_system_stats(self, stats):
         """更新系统资源统计信息"""
+        if not stats:
+            return
+
         self.cpu_label.setText(f"CPU: {stats['process_cpu']:.1f}%")
         self.memory_label.setText(f"内存: {stats['process_memory']:.1f} MB")
 
-    def update_stats(self, task=None):
+    def update_stats(self, tasks=()):
         """更新统计信息"""
-        if task:
+        for task in tasks:
             # 将任务信息添加到报告生成器
             self.report_generator.add_task_result(task)
 
@@ -709,8 +804,9 @@ class MainWindow(QMainWindow):
 
     def reset_ui_state(self):
         """重置UI状态"""
-        if hasattr(self, 'timer') and self.timer.isActive():
-            self.timer.stop()
+        # 扫描阶段出错或取消时，进度条可能仍处于忙碌状态
+        if self.progress_bar.maximum() == 0:
+            self.progress_bar.setRange(0, 100)
 
         self.start_button.setEnabled(True)
         self.pause_button.setEnabled(False)
@@ -719,6 +815,8 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         """窗口关闭事件"""
+        self.refresh_timer.stop()
+
         # 停止系统监控线程
         if hasattr(self, 'system_monitor'):
             self.system_monitor.stop()
@@ -744,15 +842,27 @@ class MainWindow(QMainWindow):
 
 
 class LogTextHandler(logging.Handler):
-    """将日志消息发送到QTextEdit的处理程序"""
+    """将日志消息发送到QTextEdit的处理程序
 
-    def __init__(self, text_edit):
+    emit可能在任意线程中调用，只把记录放入队列；由GUI线程的定时器调用drain写入控件。
+    """
+
+    def __init__(self, text_edit, max_records=500):
         super().__init__()
         self.text_edit = text_edit
+        self.max_records = max_records
+        self.queue = queue.SimpleQueue()
         self.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
 
+        # 每种颜色预先创建文本格式，直接插入纯文本，不经过HTML解析
+        self._formats = {}
+        for color in ("black", "red", "orange", "blue"):
+            text_format = QTextCharFormat()
+            text_format.setForeground(QColor(color))
+            self._formats[color] = text_format
+
     def emit(self, record):
-        """发送日志记录到文本编辑器"""
+        """将日志记录放入队列"""
         msg = self.format(record)
 
         # 不同级别的日志使用不同颜色
@@ -764,5 +874,34 @@ class LogTextHandler(logging.Handler):
         elif record.levelno >= logging.INFO:
             color = "blue"
 
-        # 添加带颜色的文本
-        self.text_edit.append(f'<span style="color:{color}">{msg}</span>')
\ No newline at end of file
+        self.queue.put_nowait((color, msg))
+
+    def drain(self):
+        """在GUI线程中取出队列中的日志（每次最多max_records条），一次性添加到文本编辑器"""
+        records = []
+        try:
+            while len(records) < self.max_records:
+                records.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if not records:
+            return
+
+        # 原来停留在底部时，添加后继续滚动到底部
+        scroll_bar = self.text_edit.verticalScrollBar()
+        at_bottom = scroll_bar.value() == scroll_bar.maximum()
+
+        document = self.text_edit.document()
+        cursor = QTextCursor(document)
+        cursor.movePosition(QTextCursor.End)
+        cursor.beginEditBlock()
+        for color, msg in records:
+            # 每条日志一个段落，添加带颜色的文本
+            if not document.isEmpty():
+                cursor.insertBlock()
+            cursor.insertText(msg, self._formats[color])
+        cursor.endEditBlock()
+
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
\ No newline at end of file
@@ -4,13 +4,42 @@ import time
 import datetime
 import zipfile
 import hashlib
-import re
+import mmap
 import shutil
+import struct
+import zlib
 import tempfile
-from typing import List, Dict, Tuple, Optional, Set, Any
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional, Set, FrozenSet, Any, Iterable, Iterator
 
 logger = logging.getLogger("ComicCompressor")
 
+# Windows文件系统不允许的字符，统一替换为下划线
+_INVALID_CHARS_TABLE = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+
+# ZIP中央目录结束记录（EOCD），位于文件末尾，其后最多跟64KiB的注释
+_EOCD_SIGNATURE = b'PK\x05\x06'
+_EOCD_STRUCT = struct.Struct('<4s4H2LH')
+_EOCD_SEARCH_SIZE = 64 * 1024
+# 本地文件头，用于定位文件数据
+_LOCAL_HEADER_STRUCT = struct.Struct('<4s5H3L2H')
+_VERIFY_CHUNK_SIZE = 1024 * 1024
+
+# 图片文件扩展名（不含点，小写），扫描器和压缩器共用
+IMAGE_EXTS = frozenset({
+    'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp',
+    'tiff', 'tif', 'ico', 'jfif', 'heic'
+})
+
+# format_size使用的单位表: (除数, 单位, 格式)
+_SIZE_UNITS = (
+    (1, 'B', '{}'),
+    (1024, 'KB', '{:.2f}'),
+    (1024 ** 2, 'MB', '{:.2f}'),
+    (1024 ** 3, 'GB', '{:.2f}'),
+)
+
 
 def setup_logging(log_file=None, console_level=logging.INFO):
     # Configure root logger
@@ -39,14 +68,12 @@ def setup_logging(log_file=None, console_level=logging.INFO):
 
 def format_size(size_bytes: int) -> str:
     """将字节大小格式化为人类可读的格式"""
-    if size_bytes < 1024:
-        return f"{size_bytes} B"
-    elif size_bytes < 1024 * 1024:
-        return f"{size_bytes / 1024:.2f} KB"
-    elif size_bytes < 1024 * 1024 * 1024:
-        return f"{size_bytes / (1024 * 1024):.2f} MB"
-    else:
-        return f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
+    # 每个单位相差2^10，由位数直接得到单位下标
+    index = 0
+    if size_bytes >= 1024:
+        index = min(len(_SIZE_UNITS) - 1, (int(size_bytes).bit_length() - 1) // 10)
+    divisor, unit, fmt = _SIZE_UNITS[index]
+    return f"{fmt.format(size_bytes / divisor if divisor > 1 else size_bytes)} {unit}"
 
 
 def format_time(seconds: float) -> str:
@@ -62,12 +89,95 @@ def format_time(seconds: float) -> str:
         return f"{int(hours)} 小时 {int(minutes)} 分"
 
 
-def is_valid_zip(file_path: str) -> bool:
-    """检查ZIP文件是否有效"""
+def _check_end_of_central_dir(file_path: str) -> bool:
+    """在文件末尾64KiB内查找中央目录结束记录，并检查中央目录的位置是否合理"""
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        tail_size = min(file_size, _EOCD_SEARCH_SIZE + _EOCD_STRUCT.size)
+        f.seek(file_size - tail_size)
+        tail = f.read(tail_size)
+
+    pos = tail.rfind(_EOCD_SIGNATURE)
+    if pos < 0 or pos + _EOCD_STRUCT.size > len(tail):
+        return False
+
+    (_, _, _, _, _, cd_size, cd_offset, _) = _EOCD_STRUCT.unpack_from(tail, pos)
+    if cd_offset == 0xFFFFFFFF or cd_size == 0xFFFFFFFF:
+        # ZIP64，由zipfile解析ZIP64记录
+        return True
+    eocd_offset = file_size - tail_size + pos
+    return cd_offset + cd_size <= eocd_offset
+
+
+def _entry_crc(view: memoryview, zinfo: zipfile.ZipInfo) -> int:
+    """直接从文件数据计算条目的CRC32（存储的条目一次计算，deflate按1MiB分块解压）"""
+    header = _LOCAL_HEADER_STRUCT.unpack_from(view, zinfo.header_offset)
+    if header[0] != b'PK\x03\x04':
+        raise zipfile.BadZipFile(f"本地文件头损坏: {zinfo.filename}")
+    start = zinfo.header_offset + _LOCAL_HEADER_STRUCT.size + header[9] + header[10]
+    data = view[start:start + zinfo.compress_size]
+    if len(data) != zinfo.compress_size:
+        raise zipfile.BadZipFile(f"文件数据不完整: {zinfo.filename}")
+
+    if zinfo.compress_type == zipfile.ZIP_STORED:
+        return zlib.crc32(data)
+
+    crc = 0
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    for offset in range(0, len(data), _VERIFY_CHUNK_SIZE):
+        chunk = data[offset:offset + _VERIFY_CHUNK_SIZE]
+        while chunk:
+            # 限制每次输出大小，避免高压缩比的数据占用大量内存
+            crc = zlib.crc32(decompressor.decompress(chunk, _VERIFY_CHUNK_SIZE), crc)
+            chunk = decompressor.unconsumed_tail
+    return zlib.crc32(decompressor.flush(), crc)
+
+
+def _find_bad_entry(zipf: zipfile.ZipFile, file_path: str) -> Optional[str]:
+    """
+    校验所有条目的CRC32，返回第一个损坏的文件名，全部正确时返回None
+    存储和deflate条目直接读取映射的文件数据计算CRC，其他情况交给zipfile解压校验
+    """
+    infolist = zipf.infolist()
+    if not infolist:
+        return None
+
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            for zinfo in infolist:
+                try:
+                    if (zinfo.compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+                            and not zinfo.flag_bits & 0x1):
+                        if _entry_crc(view, zinfo) != zinfo.CRC:
+                            return zinfo.filename
+                    else:
+                        # zipfile在读取到结尾时会检查CRC
+                        with zipf.open(zinfo) as entry:
+                            while entry.read(_VERIFY_CHUNK_SIZE):
+                                pass
+                except (zipfile.BadZipFile, zlib.error, struct.error, OSError):
+                    return zinfo.filename
+    return None
+
+
+def is_valid_zip(file_path: str, deep: bool = False) -> bool:
+    """
+    检查ZIP文件是否有效
+    默认只检查中央目录结构（只读取文件末尾和中央目录）；deep=True时解压所有文件并校验CRC
+    """
     try:
+        if not _check_end_of_central_dir(file_path):
+            logger.warning(f"无效的ZIP文件: {file_path}")
+            return False
+
         with zipfile.ZipFile(file_path, 'r') as zipf:
+            zipf.namelist()
+            if not deep:
+                return True
+
             # 测试ZIP文件完整性
-            result = zipf.testzip()
+            result = _find_bad_entry(zipf, file_path)
             if result is not None:
                 logger.warning(f"ZIP文件损坏，第一个坏文件是 {result}")
                 return False
@@ -80,46 +190,175 @@ def is_valid_zip(file_path: str) -> bool:
         return False
 
 
-def calculate_md5(file_path: str, chunk_size: int = 8192) -> str:
-    """计算文件的MD5哈希值"""
-    hash_md5 = hashlib.md5()
+def calculate_file_hash(file_path: str, algorithm: str = "md5", chunk_size: int = 1024 * 1024,
+                        raise_errors: bool = False) -> str:
+    """
+    计算文件的哈希值
+    algorithm可以是hashlib支持的任意算法，如"md5"、"sha256"
+    出错时记录日志并返回空字符串；raise_errors=True时直接抛出异常
+    """
     try:
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(chunk_size), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        hash_obj = hashlib.new(algorithm)
+        # 复用同一个缓冲区，避免每次读取都分配新的bytes对象
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        with open(file_path, "rb", buffering=0) as f:
+            while size := f.readinto(buffer):
+                hash_obj.update(view[:size])
+        return hash_obj.hexdigest()
     except Exception as e:
-        logger.error(f"计算MD5时出错: {e}")
+        if raise_errors:
+            raise
+        logger.error(f"计算{algorithm.upper()}时出错: {e}")
         return ""
 
 
-def find_images_recursively(directory: str, image_extensions: Set[str]) -> Tuple[List[str], int]:
+def calculate_md5(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """计算文件的MD5哈希值"""
+    return calculate_file_hash(file_path, "md5", chunk_size)
+
+
+def file_suffix(file_name: str) -> str:
+    """返回文件扩展名（不含点，小写）；没有扩展名或以点开头的文件名（如".jpg"）返回空字符串"""
+    dot = file_name.rfind('.')
+    return file_name[dot + 1:].lower() if dot > 0 else ''
+
+
+def is_image_name(file_name: str) -> bool:
+    """根据扩展名判断是否为图片文件"""
+    return file_suffix(file_name) in IMAGE_EXTS
+
+
+def _mark_visited(entry: os.DirEntry, visited: Set[Tuple[int, int]], lock: Lock) -> bool:
+    """记录目录的(设备号, inode)，已访问过（如绑定挂载、目录硬链接）时返回False"""
+    try:
+        st = entry.stat(follow_symlinks=False)
+        if not st.st_ino:
+            # Windows上DirEntry.stat()的st_ino和st_dev总是0，需要os.stat获取真实值
+            st = os.stat(entry.path, follow_symlinks=False)
+    except OSError:
+        return True
+    if not st.st_ino:
+        # 文件系统不提供inode时无法判断，照常遍历
+        return True
+    key = (st.st_dev, st.st_ino)
+    with lock:
+        if key in visited:
+            return False
+        visited.add(key)
+    return True
+
+
+def _scan_files(directory: str, visited: Set[Tuple[int, int]], lock: Lock) -> Iterator[os.DirEntry]:
+    """
+    递归遍历目录，生成所有非目录条目（顺序与os.walk一致）
+    DirEntry会缓存readdir返回的类型信息，避免额外的stat调用；
+    每个目录只进入一次，最坏情况下的工作量取决于不同的inode数而不是路径数
+    """
+    try:
+        it = os.scandir(directory)
+    except OSError:
+        # 与os.walk一致，跳过无法访问的目录
+        return
+
+    subdirs = []
+    with it:
+        for entry in it:
+            if entry.is_dir():
+                # 不进入符号链接目录和已访问过的目录
+                if not entry.is_symlink() and _mark_visited(entry, visited, lock):
+                    subdirs.append(entry.path)
+            else:
+                yield entry
+
+    for subdir in subdirs:
+        yield from _scan_files(subdir, visited, lock)
+
+
+def _collect_images(entries: Iterable[os.DirEntry], ext_nodot: FrozenSet[str]) -> Tuple[List[str], int]:
+    """从文件条目中筛选图片文件并累计大小，出错时返回已找到的部分"""
+    images = []
+    total_size = 0
+
+    try:
+        for entry in entries:
+            if file_suffix(entry.name) in ext_nodot:
+                images.append(entry.path)
+                total_size += entry.stat().st_size
+    except Exception as e:
+        logger.error(f"查找图片时出错: {e}")
+
+    return images, total_size
+
+
+def find_images_recursively(directory: str, image_extensions: Set[str],
+                            max_workers: Optional[int] = None) -> Tuple[List[str], int]:
     """
     递归查找目录中的所有图片文件
+    各个顶层子目录树在线程池中并行遍历（scandir在系统调用期间会释放GIL）
     返回: (图片文件路径列表, 总大小)
     """
     images = []
     total_size = 0
+    # 扩展名集合只构建一次（不带点、小写），循环中直接比较后缀
+    ext_nodot = frozenset(ext.lstrip('.').lower() for ext in image_extensions) - {''}
+
+    # 已访问目录的(设备号, inode)，各线程共享
+    visited = set()
+    lock = Lock()
 
     try:
-        for root, _, files in os.walk(directory):
-            for file in files:
-                if os.path.splitext(file.lower())[1] in image_extensions:
-                    file_path = os.path.join(root, file)
-                    images.append(file_path)
-                    total_size += os.path.getsize(file_path)
+        st = os.stat(directory)
+        if st.st_ino:
+            visited.add((st.st_dev, st.st_ino))
+
+        # 根目录下的文件直接处理，子目录交给线程池
+        root_files = []
+        subdirs = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir():
+                    if not entry.is_symlink() and _mark_visited(entry, visited, lock):
+                        subdirs.append(entry.path)
+                else:
+                    root_files.append(entry)
+        images, total_size = _collect_images(root_files, ext_nodot)
+
+        max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_collect_images, _scan_files(subdir, visited, lock), ext_nodot)
+                       for subdir in subdirs]
+
+            # 按提交顺序合并，结果顺序与单线程遍历一致
+            for future in futures:
+                subdir_images, subdir_size = future.result()
+                images.extend(subdir_images)
+                total_size += subdir_size
     except Exception as e:
         logger.error(f"查找图片时出错: {e}")
 
     return images, total_size
 
 
+def _link_or_copy(src: str, dst: str) -> str:
+    """优先创建硬链接，跨文件系统或不支持硬链接时（EXDEV/EPERM等）复制文件"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
 def create_backup(directory: str) -> Optional[str]:
-    """创建目录的备份"""
+    """
+    创建目录的备份
+    优先使用硬链接，不复制文件数据；跨文件系统或不支持硬链接时逐个文件回退为复制。
+    硬链接与原文件共享数据，适用于删除/替换原目录的场景，不适用于原地修改文件
+    """
     try:
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_dir = f"{directory}_backup_{timestamp}"
-        shutil.copytree(directory, backup_dir)
+        shutil.copytree(directory, backup_dir, copy_function=_link_or_copy)
         logger.info(f"已创建备份: {backup_dir}")
         return backup_dir
     except Exception as e:
@@ -147,12 +386,8 @@ def is_path_too_long(path: str, max_length: int = 260) -> bool:
 
 def sanitize_filename(filename: str) -> str:
     """清理文件名，移除不允许的字符"""
-    # 替换Windows文件系统不允许的字符
-    invalid_chars = r'[<>:"/\\|?*]'
-    sanitized = re.sub(invalid_chars, '_', filename)
-    # 移除结尾的空格和点
-    sanitized = sanitized.rstrip('. ')
-    return sanitized
+    # 替换不允许的字符，并移除结尾的空格和点
+    return filename.translate(_INVALID_CHARS_TABLE).rstrip('. ')
 
 
 def ensure_directory_exists(directory: str) -> bool:
@@ -168,16 +403,8 @@ def ensure_directory_exists(directory: str) -> bool:
 def get_free_space(directory: str) -> int:
     """获取目录所在磁盘的可用空间（字节）"""
     try:
-        if os.name == 'nt':  # Windows
-            import ctypes
-            free_bytes = ctypes.c_ulonglong(0)
-            ctypes.windll.kernel32.GetDiskFreeSpaceExW(
-                ctypes.c_wchar_p(directory), None, None, ctypes.pointer(free_bytes)
-            )
-            return free_bytes.value
-        else:  # Unix/Linux/MacOS
-            st = os.statvfs(directory)
-            return st.f_bavail * st.f_frsize
+        # Windows上为GetDiskFreeSpaceExW，其他系统为statvfs（f_bavail * f_frsize）
+        return shutil.disk_usage(directory).free
     except Exception as e:
         logger.error(f"获取可用空间时出错: {e}")
         return 0